@@ -4,32 +4,95 @@ Flask app for remote dashboard server
 Receives data from local serial monitor via API
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, request, send_file
+from flask.json.provider import DefaultJSONProvider
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_limiter.errors import RateLimitExceeded
-from functools import wraps
-import json
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+import bisect
+import gzip
+import hashlib
+import hmac
+import heapq
+import orjson
 import os
+import queue
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import logging
 
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; locking degrades to a no-op there
+    fcntl = None
+
+# fdatasync skips the metadata flush fsync does, but isn't available on macOS
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    # Linux only; without it cached file state is revalidated with stat()
+    INotify = None
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Route request.get_json() and any jsonify() through orjson"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
 app = Flask(__name__, static_folder='static', static_url_path='/static')
+app.json = OrjsonProvider(app)
+# Templates ship with the image; don't stat them for changes on every render
+app.config['TEMPLATES_AUTO_RELOAD'] = False
+app.jinja_env.auto_reload = False
 
 # Configuration
-API_KEY = os.environ.get('DASHBOARD_API_KEY', 'your-secure-api-key-here')
-DATA_FILE = 'data/trickortreat_data.json'
+DEFAULT_API_KEY = 'your-secure-api-key-here'
+API_KEY = os.environ.get('DASHBOARD_API_KEY', DEFAULT_API_KEY)
+_API_KEY_BYTES = API_KEY.encode()
+# Newline-delimited JSON, one entry per line, so new entries are appends
+DATA_FILE = 'data/trickortreat_data.jsonl'
+# Pre-JSONL format (a single JSON list); migrated to DATA_FILE on startup
+LEGACY_DATA_FILE = 'data/trickortreat_data.json'
 HISTORICAL_DATA_FILE = 'data/historical_data.json'
+# Pre-aggregated /historical_data response, rebuilt whenever the source changes
+HISTORICAL_PROCESSED_FILE = 'data/historical_processed.json'
+HISTORICAL_PROCESSED_GZ_FILE = HISTORICAL_PROCESSED_FILE + '.gz'
+# Browser cache lifetime for /historical_data; it only changes on archive_year
+HISTORICAL_MAX_AGE = 3600
+# Timestamps are stored in UTC; October 31 local time is EDT (UTC-4)
+LOCAL_OFFSET = timedelta(hours=-4)
+
+# Rate limit counters live in RATELIMIT_STORAGE_URI (e.g. redis://host:6379 or
+# memcached://host:11211) so every gunicorn worker enforces the same budget.
+# The in-memory default gives each worker its own counters.
+RATELIMIT_STORAGE_URI = os.environ.get('RATELIMIT_STORAGE_URI', 'memory://')
+# moving-window counts the exact trailing period instead of letting a client
+# spend two windows' budget across a boundary
+RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY', 'moving-window')
 
 # Rate limiting to prevent abuse
 limiter = Limiter(
     app=app,
     key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
+    default_limits=["200 per day", "50 per hour"],
+    storage_uri=RATELIMIT_STORAGE_URI,
+    strategy=RATELIMIT_STRATEGY
 )
 
 # Create data directory
@@ -38,140 +101,774 @@ os.makedirs('data', exist_ok=True)
 # File-backed live mode state (shared across worker processes)
 LIVE_MODE_FILE = os.path.join('data', 'live_mode.json')
 
-# In-memory cache (kept for convenience; persistent source of truth is the file)
-live_mode = {
-    'enabled': False,
-    'start_time': None,
-    'owner': None
-}
+# Set when the server runs as a single process (gunicorn -w 1 --threads N).
+# Live mode is then only ever changed by this process, so reads are served
+# from memory and the file is kept purely for persistence across restarts.
+SINGLE_PROCESS = os.environ.get('DASHBOARD_SINGLE_PROCESS', '').lower() in ('1', 'true', 'yes')
+
+# Seconds a checked live mode state is reused before the file is stat'ed again.
+# Bounds how long other workers take to see a toggle.
+LIVE_MODE_CACHE_TTL = float(os.environ.get('LIVE_MODE_CACHE_TTL', '0.5'))
+
+# Parsed copy of LIVE_MODE_FILE keyed by its stat signature. Writes go through
+# os.replace, so the inode changes on every save even within one mtime tick.
+_LIVE_CACHE = {'signature': None, 'state': None, 'expires': 0.0, 'gen': None}
+# Guards _LIVE_CACHE so readers never pair one state with another's signature.
+# Re-entrant because a load may repair the file through save_live_mode_to_file.
+_LIVE_LOCK = threading.RLock()
+
+# Encoded response bodies for file-derived endpoints (see cached_file_response)
+_RESPONSE_CACHE = {}
+
+# Parsed DATA_FILE, extended as lines are appended (see load_data_index)
+INDEX_TAIL_BYTES = 64
+# A file modified this recently may change again within the same mtime tick
+# (coarse on some filesystems), so an unchanged stat() is not trusted for it
+RACY_MTIME_NS = 2 * 10**9
+_DATA_INDEX = {'inode': None, 'offset': 0, 'mtime_ns': None, 'tail': b'', 'gen': None,
+               'version': 0, 'entries': [], 'by_year': defaultdict(list)}
+_DATA_LOCK = threading.Lock()
+
+# Incrementally maintained /stats counters (see get_stats_counts)
+_STATS_INDEX = {'inode': None, 'offset': 0, 'mtime_ns': None, 'tail': b'', 'gen': None,
+                'year': None, 'year_count': 0, 'recent': []}
+_STATS_LOCK = threading.Lock()
+STATS_RECENT_MINUTES = 5
+
+# Appends waiting for the writer thread (see queue_append)
+APPEND_BATCH_MAX = 256
+_APPEND_QUEUE = queue.Queue()
+_APPEND_THREAD = None
+_APPEND_THREAD_LOCK = threading.Lock()
+
+# Per-file change counters bumped by the inotify watcher (see start_data_watcher)
+_FILE_GENERATIONS = defaultdict(int)
+_WATCHER = {'running': False}
+
+# Current year and the epoch time (next local midnight) it is valid until
+_YEAR_CACHE = {'year': None, 'until': 0.0}
+
+# Held while a background rebuild of HISTORICAL_PROCESSED_FILE is running
+_HIST_REFRESH_LOCK = threading.Lock()
 
 def initialize_live_mode():
     """Initialize live mode state from file."""
     try:
         state = load_live_mode_from_file()
-        live_mode.clear()
-        live_mode.update(state)
         logger.info("Initialized live mode from file: enabled=%s, owner=%s",
                    state.get('enabled'), state.get('owner'))
     except Exception as e:
         logger.error("Failed to initialize live mode state: %s", e)
 
-# Initialize state when module loads - each worker will do this on startup
-initialize_live_mode()
+def load_live_mode_from_file(fresh: bool = False):
+    """Load live mode dict from the JSON file. Returns a dict with keys 'enabled', 'start_time' (ISO str or None), 'owner'.
 
-def load_live_mode_from_file():
-    """Load live mode dict from the JSON file. Returns a dict with keys 'enabled', 'start_time' (ISO str or None), 'owner'."""
-    try:
-        if os.path.exists(LIVE_MODE_FILE):
-            with open(LIVE_MODE_FILE, 'r') as lf:
-                data = json.load(lf)
-                # Ensure keys exist and types are correct
-                state = {
-                    'enabled': bool(data.get('enabled', False)),
-                    'start_time': data.get('start_time'),
-                    'owner': data.get('owner')
+    A state checked within the last LIVE_MODE_CACHE_TTL seconds (or, with the
+    inotify watcher running, since the file last changed) is returned without
+    touching the file; pass fresh=True to always check it (e.g. for
+    read-modify-write under the file lock). The returned dict is shared
+    between requests - treat it as read-only and copy it before changing it.
+    """
+    with _LIVE_LOCK:
+        gen = watched_generation(LIVE_MODE_FILE)
+        if _LIVE_CACHE['state'] is not None:
+            if gen is not None:
+                # The watcher reports changes, so the TTL isn't needed
+                unchanged = gen == _LIVE_CACHE['gen']
+            else:
+                unchanged = time.monotonic() < _LIVE_CACHE['expires']
+            if SINGLE_PROCESS or (not fresh and unchanged):
+                return _LIVE_CACHE['state']
+        try:
+            try:
+                st = os.stat(LIVE_MODE_FILE)
+            except FileNotFoundError:
+                st = None
+            if st is not None:
+                signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+                if _LIVE_CACHE['signature'] == signature:
+                    _LIVE_CACHE['expires'] = time.monotonic() + LIVE_MODE_CACHE_TTL
+                    _LIVE_CACHE['gen'] = gen
+                    return _LIVE_CACHE['state']
+                with open(LIVE_MODE_FILE, 'rb') as lf:
+                    data = orjson.loads(lf.read())
+                    # Ensure keys exist and types are correct
+                    state = {
+                        'enabled': bool(data.get('enabled', False)),
+                        'start_time': data.get('start_time'),
+                        'owner': data.get('owner')
+                    }
+                    # Validate start_time if present
+                    if state['start_time']:
+                        try:
+                            datetime.fromisoformat(state['start_time'])
+                        except (ValueError, TypeError):
+                            logger.warning("Invalid start_time in live mode file, resetting")
+                            state['start_time'] = None
+                    # If enabled but no start time, add one
+                    if state['enabled'] and not state['start_time']:
+                        state['start_time'] = datetime.now().isoformat()
+                        # Re-save to fix the missing start time (refreshes the cache)
+                        save_live_mode_to_file(state)
+                    else:
+                        _LIVE_CACHE['signature'] = signature
+                        _LIVE_CACHE['state'] = state
+                        _LIVE_CACHE['expires'] = time.monotonic() + LIVE_MODE_CACHE_TTL
+                        _LIVE_CACHE['gen'] = gen
+                    return state
+            else:
+                # Create initial state file if it doesn't exist
+                initial_state = {
+                    'enabled': False,
+                    'start_time': None,
+                    'owner': None
                 }
-                # Validate start_time if present
-                if state['start_time']:
-                    try:
-                        datetime.fromisoformat(state['start_time'])
-                    except (ValueError, TypeError):
-                        logger.warning("Invalid start_time in live mode file, resetting")
-                        state['start_time'] = None
-                # If enabled but no start time, add one
-                if state['enabled'] and not state['start_time']:
-                    state['start_time'] = datetime.now().isoformat()
-                    # Re-save to fix the missing start time
-                    save_live_mode_to_file(state)
-                return state
-        else:
-            # Create initial state file if it doesn't exist
-            initial_state = {
+                save_live_mode_to_file(initial_state)
+                return initial_state
+        except Exception as e:
+            logger.exception('Failed to load live mode file: %s', e)
+            # On error, force disabled state for safety
+            return {
                 'enabled': False,
                 'start_time': None,
                 'owner': None
             }
-            save_live_mode_to_file(initial_state)
-            return initial_state
-    except Exception as e:
-        logger.exception('Failed to load live mode file: %s', e)
-        # On error, force disabled state for safety
-        return {
-            'enabled': False,
-            'start_time': None,
-            'owner': None
-        }
 
 
 def save_live_mode_to_file(state: dict):
-    """Atomically save live mode dict to the JSON file."""
-    try:
-        tmp = LIVE_MODE_FILE + '.tmp'
-        with open(tmp, 'w') as lf:
-            json.dump({
+    """Atomically save live mode dict to the JSON file.
+
+    Skips the write when the file still holds exactly this state.
+    """
+    with _LIVE_LOCK:
+        try:
+            saved = {
                 'enabled': bool(state.get('enabled', False)),
                 'start_time': state.get('start_time'),
                 'owner': state.get('owner')
-            }, lf)
-        # atomic replace
-        os.replace(tmp, LIVE_MODE_FILE)
-        logger.debug("Saved live mode state to file: enabled=%s, owner=%s",
-                   state.get('enabled'), state.get('owner'))
-    except Exception as e:
-        logger.exception('Failed to save live mode file: %s', e)
-        raise  # Re-raise to ensure caller knows save failed
+            }
+            if _LIVE_CACHE['state'] == saved:
+                try:
+                    st = os.stat(LIVE_MODE_FILE)
+                    if _LIVE_CACHE['signature'] == (st.st_ino, st.st_mtime_ns, st.st_size):
+                        return
+                except FileNotFoundError:
+                    pass
+            atomic_write(LIVE_MODE_FILE, orjson.dumps(saved))
+            # Prime the cache so the writer doesn't re-read its own write
+            st = os.stat(LIVE_MODE_FILE)
+            _LIVE_CACHE['signature'] = (st.st_ino, st.st_mtime_ns, st.st_size)
+            _LIVE_CACHE['state'] = saved
+            _LIVE_CACHE['expires'] = time.monotonic() + LIVE_MODE_CACHE_TTL
+            _LIVE_CACHE['gen'] = None  # our own write is still to come through the watcher
+            logger.debug("Saved live mode state to file: enabled=%s, owner=%s",
+                       state.get('enabled'), state.get('owner'))
+        except Exception as e:
+            logger.exception('Failed to save live mode file: %s', e)
+            raise  # Re-raise to ensure caller knows save failed
+
+
+def watched_generation(path: str) -> Optional[int]:
+    """Change counter for a file in data/ while the watcher runs, else None.
+
+    Cached state recorded with the same generation is known to be current
+    without a stat(). Capture it before checking the file, so a change that
+    lands mid-read bumps it past the recorded value.
+    """
+    if not _WATCHER['running']:
+        return None
+    return _FILE_GENERATIONS[os.path.basename(path)]
+
+
+def start_data_watcher():
+    """Start an inotify thread that bumps _FILE_GENERATIONS on every change"""
+    if INotify is None or _WATCHER['running']:
+        return
+    try:
+        inotify = INotify()
+        inotify.add_watch('data', inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE
+                          | inotify_flags.MOVED_TO | inotify_flags.CREATE | inotify_flags.DELETE)
+    except OSError as e:
+        logger.warning("inotify unavailable, using stat checks: %s", e)
+        return
+
+    def run():
+        try:
+            while True:
+                for event in inotify.read():
+                    if event.mask & inotify_flags.Q_OVERFLOW:
+                        # Events were dropped - treat every file as changed
+                        for name in list(_FILE_GENERATIONS):
+                            _FILE_GENERATIONS[name] += 1
+                    else:
+                        _FILE_GENERATIONS[event.name] += 1
+        except Exception as e:
+            logger.error("data/ watcher stopped, using stat checks: %s", e)
+        finally:
+            _WATCHER['running'] = False
+
+    _WATCHER['running'] = True
+    threading.Thread(target=run, name='data-watcher', daemon=True).start()
+
+
+@contextmanager
+def file_lock(path: str):
+    """Hold an exclusive advisory lock on a companion path + '.lock' file.
+
+    Serializes read-modify-write cycles across gunicorn workers and threads.
+    Readers don't take it: every writer either appends whole lines or swaps the
+    file in with os.replace. Usable as a decorator as well as a with-block.
+    """
+    with open(path + '.lock', 'a') as lf:
+        if fcntl is not None:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
+
+def atomic_write(path: str, payload: bytes):
+    """Replace path with payload so readers see either the old or new file.
+
+    The temp name is unique per worker thread, and the data is fsync'ed
+    before the rename so a crash can't leave a truncated file behind.
+    """
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def api_key_valid(api_key: Optional[str]) -> bool:
+    """Compare a presented key against API_KEY in constant time"""
+    return bool(api_key) and hmac.compare_digest(api_key.encode(), _API_KEY_BYTES)
 
 
 def require_api_key(f):
     """Decorator to require API key authentication"""
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        if api_key and api_key == API_KEY:
+        if api_key_valid(request.headers.get('X-API-Key')):
             return f(*args, **kwargs)
-        logger.warning(f"Unauthorized API access attempt from {request.remote_addr}")
-        return jsonify({'error': 'Unauthorized - Invalid API key'}), 401
+        logger.warning("Unauthorized API access attempt from %s", request.remote_addr)
+        return json_response({'error': 'Unauthorized - Invalid API key'}, 401)
     return decorated_function
 
 
+# Pre-encoded bodies for the empty replies. A fresh Response is built around
+# them each time since after_request hooks (e.g. the limiter) add headers.
+EMPTY_LIST_JSON = b'[]'
+EMPTY_DICT_JSON = b'{}'
+
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    """Serialize payload with orjson, bypassing Flask's Python JSON encoder"""
+    return Response(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS),
+                    status=status, mimetype='application/json')
+
+
+def cached_file_response(path: str, build: Callable[[], Any], key: Any = None,
+                         signature: Any = None) -> Response:
+    """Serve build()'s JSON, re-running it only when the file at path changes.
+
+    The encoded body, a gzip copy and its ETag are kept per key (default: the
+    path), keyed by the file's stat signature, so repeated dashboard polls
+    cost a stat() instead of a full parse/group/encode. Clients sending a
+    matching If-None-Match get a 304. Bodies built from the DATA_FILE index
+    pass its data_index_version() as signature instead, so they are keyed
+    on the entries they were built from.
+    """
+    if key is None:
+        key = path
+    if signature is None:
+        st = os.stat(path)
+        signature = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _RESPONSE_CACHE.get(key)
+    if cached is None or cached['signature'] != signature:
+        body = orjson.dumps(build(), option=orjson.OPT_NON_STR_KEYS)
+        cached = {
+            'signature': signature,
+            'body': body,
+            'gzip': gzip.compress(body, compresslevel=6),
+            'etag': hashlib.blake2b(body, digest_size=16).hexdigest()
+        }
+        _RESPONSE_CACHE[key] = cached
+    if 'gzip' in request.accept_encodings:
+        response = Response(cached['gzip'], mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        # Distinct representation, distinct validator
+        response.set_etag(cached['etag'] + '-gz')
+    else:
+        response = Response(cached['body'], mimetype='application/json')
+        response.set_etag(cached['etag'])
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+
+def read_appended_entries(index: Dict[str, Any]) -> Tuple[bool, List[Dict[str, Any]]]:
+    """Advance a tail position over DATA_FILE and parse the new entries.
+
+    index holds 'inode', 'offset', 'mtime_ns' and 'tail' (the last bytes
+    consumed) from the previous call. Returns (reset, entries): reset is True
+    when the file was replaced, truncated or removed, in which case entries
+    holds the whole file from the start. The tail bytes are re-read and
+    compared so an undo followed by new appends is not mistaken for growth,
+    including while the mtime is recent enough that an undo and an add of the
+    same length could leave stat() unchanged. Callers forcing a rescan must
+    clear 'gen' along with 'inode'.
+    """
+    gen = watched_generation(DATA_FILE)
+    if gen is not None and gen == index['gen']:
+        return False, []
+    try:
+        st = os.stat(DATA_FILE)
+    except FileNotFoundError:
+        st = None
+    index['gen'] = gen
+
+    reset = st is None or st.st_ino != index['inode'] or st.st_size < index['offset']
+    if reset:
+        index.update({'inode': st.st_ino if st else None, 'offset': 0,
+                      'mtime_ns': None, 'tail': b''})
+    elif (st.st_size == index['offset'] and st.st_mtime_ns == index['mtime_ns']
+            and time.time_ns() - st.st_mtime_ns > RACY_MTIME_NS):
+        return False, []
+
+    entries = []
+    if st is not None:
+        start = index['offset'] - len(index['tail'])
+        with open(DATA_FILE, 'rb') as f:
+            f.seek(start)
+            chunk = f.read(st.st_size - start)
+        if not chunk.startswith(index['tail']):
+            # Rewritten in place since the last call - start over. Clear the
+            # generation too, or the retry would take the unchanged-gen exit.
+            index['inode'] = None
+            index['gen'] = None
+            return read_appended_entries(index)
+        chunk = chunk[len(index['tail']):]
+        # Only consume complete lines; a partial append is picked up next time
+        complete = chunk[:chunk.rfind(b'\n') + 1]
+        index['offset'] += len(complete)
+        index['mtime_ns'] = st.st_mtime_ns
+        index['tail'] = (index['tail'] + complete)[-INDEX_TAIL_BYTES:]
+        for line in complete.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # e.g. a torn line after a crash - keep the rest
+                logger.warning("Skipping malformed data line: %r", line[:200])
+    return reset, entries
+
+
+def entry_sort_key(entry: Dict[str, Any]) -> str:
+    """Sort key putting entries in timestamp order"""
+    return entry.get('timestamp') or ''
+
+
+def add_to_year_index(by_year: Dict[Any, List[Dict[str, Any]]], entry: Dict[str, Any]):
+    """Add entry to its year's list, keeping that list in timestamp order.
+
+    Live adds arrive in order and are appended; only a late batch upload
+    from a local monitor pays for an insort.
+    """
+    year_entries = by_year[entry.get('year')]
+    if year_entries and entry_sort_key(entry) < entry_sort_key(year_entries[-1]):
+        bisect.insort(year_entries, entry, key=entry_sort_key)
+    else:
+        year_entries.append(entry)
+
+
+def load_data_index() -> Tuple[List[Dict[str, Any]], Dict[Any, List[Dict[str, Any]]]]:
+    """Return (all entries, entries grouped by year) for DATA_FILE.
+
+    Both are built once and then extended with newly appended lines, so the
+    endpoints share one parse instead of each filtering the full list. Entries
+    are in file order; each year's list is in timestamp order. The returned
+    containers are shared between requests - treat them as read-only.
+    """
+    with _DATA_LOCK:
+        index = _DATA_INDEX
+        reset, new_entries = read_appended_entries(index)
+        if reset:
+            # Fresh containers so earlier callers keep a consistent snapshot
+            index['entries'] = []
+            index['by_year'] = defaultdict(list)
+        for entry in new_entries:
+            index['entries'].append(entry)
+            add_to_year_index(index['by_year'], entry)
+        if reset or new_entries:
+            index['version'] += 1
+        return index['entries'], index['by_year']
+
+
+def data_index_version() -> int:
+    """Bring the DATA_FILE index up to date and return its version.
+
+    The version is bumped whenever the indexed entries change, so it keys
+    cached responses on the data they were built from rather than on the
+    file's stat signature or a watcher generation that may not have caught
+    up with the write yet.
+    """
+    load_data_index()
+    return _DATA_INDEX['version']
+
+
 def load_data() -> List[Dict[str, Any]]:
-    """Load current year data from file"""
-    if not os.path.exists(DATA_FILE):
-        return []
-    
+    """Load all entries from file as a list the caller may modify"""
     try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
+        entries, _ = load_data_index()
+        return list(entries)
     except Exception as e:
-        logger.error(f"Error loading data: {e}")
+        logger.error("Error loading data: %s", e)
         return []
 
 
+def encode_entries(entries: List[Dict[str, Any]]) -> bytes:
+    """Encode entries as JSONL bytes (one object per line)"""
+    # orjson writes the newline itself, saving a concatenation copy per line
+    dumps, option = orjson.dumps, orjson.OPT_APPEND_NEWLINE
+    return b''.join([dumps(entry, option=option) for entry in entries])
+
+
 def save_data(data: List[Dict[str, Any]]):
-    """Save data to file"""
+    """Atomically rewrite the whole data file.
+
+    Only used for the legacy migration and for undo's fallback when the last
+    line is torn; a normal undo truncates in place (see remove_last_entry).
+    """
     try:
-        with open(DATA_FILE, 'w') as f:
-            json.dump(data, f, indent=2)
+        # Encode once and hand the whole payload to a single write().
+        payload = encode_entries(data)
+        atomic_write(DATA_FILE, payload)
+        st = os.stat(DATA_FILE)
+        data_file_written()
     except Exception as e:
-        logger.error(f"Error saving data: {e}")
+        logger.error("Error saving data: %s", e)
+        return
 
+    # Seed the index with what was just written so the next read doesn't
+    # re-parse the whole file. Offset is the payload length, not st_size, so
+    # anything appended since the replace is still picked up.
+    by_year = defaultdict(list)
+    for entry in data:
+        add_to_year_index(by_year, entry)
+    with _DATA_LOCK:
+        _DATA_INDEX.update({'inode': st.st_ino, 'offset': len(payload),
+                            'mtime_ns': st.st_mtime_ns, 'tail': payload[-INDEX_TAIL_BYTES:],
+                            'version': _DATA_INDEX['version'] + 1,
+                            'entries': list(data), 'by_year': by_year})
 
-def get_elapsed_seconds() -> int:
-    """Get seconds elapsed since live mode was enabled"""
-    state = load_live_mode_from_file()
+
+def data_file_written():
+    """Make this worker's indexes re-check DATA_FILE after its own write.
+
+    The inotify event for the write arrives asynchronously, so without this
+    a read straight after a write could still trust the old generation.
+    """
+    _DATA_INDEX['gen'] = None
+    _STATS_INDEX['gen'] = None
+
+
+def append_data(entries: List[Dict[str, Any]]):
+    """Append entries to the data file with a single O_APPEND write.
+
+    Uses a raw fd to skip Python's buffered/text I/O layers. The fd is opened
+    per call rather than kept for the worker's lifetime because save_data
+    (migration, or undo's torn-line fallback) replaces the file with a new
+    inode, which would strand a long-lived descriptor on the old copy. The
+    lock keeps appends from landing inside an undo truncation or rewrite.
+    Returns once the data has been flushed to disk.
+    """
+    payload = encode_entries(entries)
+    remaining = memoryview(payload)
+    with file_lock(DATA_FILE):
+        fd = os.open(DATA_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            start = os.fstat(fd).st_size
+            while remaining:
+                written = os.write(fd, remaining)
+                remaining = remaining[written:]
+            # One flush per call; queue_append groups concurrent adds into a
+            # single call, so a burst shares the cost
+            _fdatasync(fd)
+            st = os.fstat(fd)
+        finally:
+            os.close(fd)
+    data_file_written()
+
+    # Add the entries to the index directly when it had read up to where
+    # they were written, so this worker never re-parses its own appends
+    with _DATA_LOCK:
+        index = _DATA_INDEX
+        if index['inode'] == st.st_ino and index['offset'] == start:
+            for entry in entries:
+                index['entries'].append(entry)
+                add_to_year_index(index['by_year'], entry)
+            index.update({'offset': start + len(payload), 'mtime_ns': st.st_mtime_ns,
+                          'tail': (index['tail'] + payload)[-INDEX_TAIL_BYTES:],
+                          'version': index['version'] + 1})
+
+    # Same for the /stats counters, so a poll after an add needn't read it back
+    cutoff = time.time() - STATS_RECENT_MINUTES * 60
+    with _STATS_LOCK:
+        index = _STATS_INDEX
+        if index['inode'] == st.st_ino and index['offset'] == start:
+            for entry in entries:
+                add_to_stats_index(index, entry, cutoff)
+            index.update({'offset': start + len(payload), 'mtime_ns': st.st_mtime_ns,
+                          'tail': (index['tail'] + payload)[-INDEX_TAIL_BYTES:]})
+
+
+def _append_writer():
+    """Drain queued appends and write each group with one append_data call"""
+    while True:
+        batch = [_APPEND_QUEUE.get()]
+        while len(batch) < APPEND_BATCH_MAX:
+            try:
+                batch.append(_APPEND_QUEUE.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            append_data([entry for entries, _, _ in batch for entry in entries])
+        except Exception as e:
+            for _, _, outcome in batch:
+                outcome['error'] = e
+        for _, done, _ in batch:
+            done.set()
+
+
+def queue_append(entries: List[Dict[str, Any]]):
+    """Append entries via the worker's writer thread and wait until written.
+
+    Requests that arrive while a write is in progress are coalesced into the
+    next one, so a burst of adds costs one lock and one write() per group
+    instead of per entry. Returns only once the entries are on disk.
+    """
+    global _APPEND_THREAD
+    with _APPEND_THREAD_LOCK:
+        if _APPEND_THREAD is None or not _APPEND_THREAD.is_alive():
+            _APPEND_THREAD = threading.Thread(target=_append_writer, name='append-writer', daemon=True)
+            _APPEND_THREAD.start()
+    done, outcome = threading.Event(), {}
+    _APPEND_QUEUE.put((entries, done, outcome))
+    done.wait()
+    if 'error' in outcome:
+        raise outcome['error']
+
+
+def remove_last_entry() -> Optional[Dict[str, Any]]:
+    """Cut the final entry off DATA_FILE in place and return it.
+
+    Reads backwards from the end to the start of the last line and truncates
+    there, so undo costs one small read instead of a full rewrite. The caller
+    must hold file_lock(DATA_FILE). Returns None when there is nothing to undo.
+    """
+    with open(DATA_FILE, 'r+b') as f:
+        end = f.seek(0, os.SEEK_END)
+        pos, tail = end, b''
+        while pos > 0 and b'\n' not in tail.rstrip():
+            step = min(4096, pos)
+            pos -= step
+            f.seek(pos)
+            tail = f.read(step) + tail
+        body = tail.rstrip()
+        cut = body.rfind(b'\n') + 1
+        if not body[cut:]:
+            return None
+        entry = orjson.loads(body[cut:])
+        f.truncate(pos + cut)
+        st = os.fstat(f.fileno())
+    data_file_written()
+
+    # Drop the entry from the index too when it is caught up with the file,
+    # rather than letting the shrink trigger a full re-parse
+    with _DATA_LOCK:
+        index = _DATA_INDEX
+        if (index['inode'] == st.st_ino and index['offset'] == end
+                and index['entries'] and index['entries'][-1] == entry):
+            removed = index['entries'][-1]
+            by_year = dict(index['by_year'])
+            by_year[entry.get('year')] = [e for e in by_year[entry.get('year')] if e is not removed]
+            index.update({'offset': pos + cut, 'mtime_ns': st.st_mtime_ns,
+                          'tail': body[:cut][-INDEX_TAIL_BYTES:],
+                          'version': index['version'] + 1,
+                          'entries': index['entries'][:-1],
+                          'by_year': defaultdict(list, by_year)})
+    return entry
+
+
+def count_entries() -> int:
+    """Count stored entries.
+
+    Goes through the shared index, which only parses lines appended since
+    its last use, instead of reading the whole file on every add.
+    """
+    entries, _ = load_data_index()
+    return len(entries)
+
+
+def current_year() -> int:
+    """Return the current local year, recomputed only after local midnight"""
+    cache = _YEAR_CACHE
+    if time.time() >= cache['until']:
+        now = datetime.now()
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        cache['year'] = now.year
+        cache['until'] = (midnight + timedelta(days=1)).timestamp()
+    return cache['year']
+
+
+def parse_entry_time(timestamp_str: str) -> datetime:
+    """Parse a stored entry timestamp into a timezone-aware UTC datetime"""
+    # fromisoformat accepts the 'Z' suffix and any offset on Python 3.11+
+    entry_time = datetime.fromisoformat(timestamp_str)
+    if entry_time.tzinfo is None:
+        # No timezone info - assume UTC
+        return entry_time.replace(tzinfo=timezone.utc)
+    if entry_time.tzinfo != timezone.utc:
+        entry_time = entry_time.astimezone(timezone.utc)
+    return entry_time
+
+
+def add_to_stats_index(index: Dict[str, Any], entry: Dict[str, Any], cutoff: float):
+    """Count entry in the /stats counters if it is from the index's year"""
+    if entry.get('year') != index['year']:
+        return
+    index['year_count'] += 1
+    entry_ts = entry.get('ts_epoch')
+    if not isinstance(entry_ts, (int, float)):
+        # Older entries and naive batch uploads only carry the ISO string
+        timestamp_str = entry.get('timestamp')
+        if not timestamp_str:
+            return
+        try:
+            entry_ts = parse_entry_time(timestamp_str).timestamp()
+        except (ValueError, AttributeError) as e:
+            logger.debug("Skipping entry with unparseable timestamp: %s, error: %s", timestamp_str, e)
+            return
+    if entry_ts > cutoff:
+        heapq.heappush(index['recent'], entry_ts)
+
+
+def get_stats_counts(recent_minutes: int = STATS_RECENT_MINUTES):
+    """Return (current year entry count, entries in the last recent_minutes).
+
+    DATA_FILE is append-only, so the counters are advanced by reading only
+    the bytes appended since the last call - including appends made by other
+    workers. A rewrite (new inode, e.g. undo) or a new year triggers a rescan.
+    """
+    now_utc = datetime.now(timezone.utc)
+    cutoff = (now_utc - timedelta(minutes=recent_minutes)).timestamp()
+    year = current_year()
+
+    with _STATS_LOCK:
+        index = _STATS_INDEX
+        if index['year'] != year:
+            # Force a rescan from the start, past the watcher generation check
+            index['inode'] = None
+            index['gen'] = None
+
+        reset, new_entries = read_appended_entries(index)
+        if reset:
+            index['year'] = year
+            index['year_count'] = 0
+            index['recent'].clear()
+
+        for entry in new_entries:
+            add_to_stats_index(index, entry, cutoff)
+
+        # Batch uploads may arrive out of order, so 'recent' is a min-heap and
+        # expired times are popped off the front as the cutoff moves forward
+        recent = index['recent']
+        while recent and recent[0] <= cutoff:
+            heapq.heappop(recent)
+        return index['year_count'], len(recent)
+
+
+def migrate_legacy_data():
+    """Convert the legacy JSON list file to JSONL if no JSONL file exists yet"""
+    if os.path.exists(DATA_FILE) or not os.path.exists(LEGACY_DATA_FILE):
+        return
+    try:
+        with open(LEGACY_DATA_FILE, 'rb') as f:
+            legacy = orjson.loads(f.read())
+        legacy.sort(key=entry_sort_key)
+        with file_lock(DATA_FILE):
+            if os.path.exists(DATA_FILE):
+                return  # another worker migrated first
+            save_data(legacy)
+        logger.info("Migrated %d entries from %s to %s", len(legacy), LEGACY_DATA_FILE, DATA_FILE)
+    except Exception as e:
+        logger.error("Failed to migrate legacy data file: %s", e)
+
+
+migrate_legacy_data()
+
+
+@lru_cache(maxsize=4096)
+def historical_time_of_day(timestamp_str: str) -> str:
+    """Map a stored historical timestamp to a local 'HH:MM' slot.
+
+    Handles both UTC and legacy local timestamps. Historical data is
+    append-only, so the same strings recur on every request and are memoized.
+    """
+    timestamp = datetime.fromisoformat(timestamp_str)
+    if timestamp.tzinfo is not None:
+        # UTC timestamp - convert to local time
+        timestamp += LOCAL_OFFSET
+    # else: legacy local timestamp without timezone
+    return timestamp.strftime('%H:%M')
+
+
+@lru_cache(maxsize=8)
+def live_start_epoch(start_time: str) -> float:
+    """Parse a live mode start_time once; polls then only subtract floats"""
+    return datetime.fromisoformat(start_time).timestamp()
+
+
+def get_elapsed_seconds(state: Optional[Dict[str, Any]] = None) -> int:
+    """Get seconds elapsed since live mode was enabled.
+
+    Pass an already loaded live mode state to avoid reading it again.
+    """
+    if state is None:
+        state = load_live_mode_from_file()
     if not state.get('enabled') or not state.get('start_time'):
         return 0
     try:
-        start = datetime.fromisoformat(state.get('start_time'))
-        return int((datetime.now() - start).total_seconds())
+        return int(time.time() - live_start_epoch(state['start_time']))
     except Exception:
         return 0
 
 
+@lru_cache(maxsize=1)
+def render_dashboard() -> bytes:
+    """Render the dashboard page once; it has no per-request context.
+
+    Rendered lazily on the first request rather than at import so url_for()
+    sees the real script root when deployed under a path prefix.
+    """
+    return render_template('trickortreat_dashboard.html').encode('utf-8')
+
+
 @app.route('/')
 def index():
     """Serve dashboard HTML"""
-    return render_template('trickortreat_dashboard.html')
+    return Response(render_dashboard(), mimetype='text/html')
 
 
 @app.route('/live_status', methods=['GET'])
@@ -179,15 +876,20 @@ def index():
 def get_live_status():
     """Get current live mode status"""
     state = load_live_mode_from_file()
-    return jsonify({
-        'live': state.get('enabled', False),
-        'elapsed_seconds': get_elapsed_seconds()
-    })
+    signature = (state.get('enabled', False), get_elapsed_seconds(state))
+    # Every open tab polls this; the body only changes once a second
+    cached = _RESPONSE_CACHE.get('live_status')
+    if cached is None or cached['signature'] != signature:
+        body = orjson.dumps({'live': signature[0], 'elapsed_seconds': signature[1]})
+        cached = {'signature': signature, 'body': body}
+        _RESPONSE_CACHE['live_status'] = cached
+    return Response(cached['body'], mimetype='application/json')
 
 
 @app.route('/set_live', methods=['POST'])
 @require_api_key
 @limiter.limit("30 per minute")
+@file_lock(LIVE_MODE_FILE)
 def set_live():
     """Set live mode on/off"""
     try:
@@ -199,7 +901,7 @@ def set_live():
         logger.info("Processing set_live request: desired=%s, owner=%s", desired, owner)
 
         # Load authoritative state from file
-        current = load_live_mode_from_file()
+        current = load_live_mode_from_file(fresh=True)
         logger.debug("Current state from file: enabled=%s, owner=%s", 
                     current.get('enabled'), current.get('owner'))
 
@@ -218,9 +920,9 @@ def set_live():
             current_owner = current.get('owner')
             if current_owner and owner and current_owner != owner:
                 logger.warning("Rejecting live disable from owner=%s (current owner=%s)", owner, current_owner)
-                return jsonify({
+                return json_response({
                     'live': current.get('enabled', False),
-                    'elapsed_seconds': get_elapsed_seconds(),
+                    'elapsed_seconds': get_elapsed_seconds(current),
                     'error': 'Cannot disable - owned by different client'
                 })
             else:
@@ -234,9 +936,9 @@ def set_live():
             # No change needed
             logger.debug("No state change needed (desired=%s, current enabled=%s)", 
                         desired, current.get('enabled'))
-            return jsonify({
+            return json_response({
                 'live': current.get('enabled', False),
-                'elapsed_seconds': get_elapsed_seconds()
+                'elapsed_seconds': get_elapsed_seconds(current)
             })
 
         # Persist new state to file first
@@ -244,28 +946,116 @@ def set_live():
             save_live_mode_to_file(new_state)
         except Exception as e:
             logger.error("Failed to save live mode state: %s", e)
-            return jsonify({
+            return json_response({
                 'error': 'Failed to save state',
                 'live': current.get('enabled', False),
-                'elapsed_seconds': get_elapsed_seconds()
-            }), 500
+                'elapsed_seconds': get_elapsed_seconds(current)
+            }, 500)
 
-        # Only update in-memory cache after successful file save
-        live_mode.clear()
-        live_mode.update(new_state)
-        
-        # Verify the change was saved
-        verify = load_live_mode_from_file()
+        # The save went through os.replace, so new_state is what's on disk
         logger.info("Live mode change completed: enabled=%s, owner=%s", 
-                   verify.get('enabled'), verify.get('owner'))
+                   new_state.get('enabled'), new_state.get('owner'))
         
-        return jsonify({
-            'live': verify.get('enabled', False),
-            'elapsed_seconds': get_elapsed_seconds()
+        return json_response({
+            'live': new_state.get('enabled', False),
+            'elapsed_seconds': get_elapsed_seconds(new_state)
         })
     except Exception as e:
-        logger.error(f"Error setting live mode: {e}")
-        return jsonify({'error': str(e)}), 400
+        logger.error("Error setting live mode: %s", e)
+        return json_response({'error': str(e)}, 400)
+
+
+def group_historical_data(data: Optional[List[Dict[str, Any]]] = None) -> Dict[Any, Dict[str, Dict[str, Any]]]:
+    """Group historical data by year and time of day with per-slot averages.
+
+    Reads HISTORICAL_DATA_FILE unless the caller already has its contents.
+    """
+    if data is None:
+        with open(HISTORICAL_DATA_FILE, 'rb') as f:
+            data = orjson.loads(f.read())
+
+    # Fold counts into per-slot running totals instead of collecting lists
+    totals = defaultdict(lambda: defaultdict(lambda: [0, 0]))
+    for entry in data:
+        timestamp_str = entry['timestamp']
+
+        try:
+            time_of_day = historical_time_of_day(timestamp_str)
+        except Exception as e:
+            logger.warning("Failed to parse timestamp %s: %s", timestamp_str, e)
+            continue
+
+        slot = totals[entry['year']][time_of_day]
+        slot[0] += entry['count']
+        slot[1] += 1
+
+    # Calculate averages
+    processed_data = {}
+    for year, time_data in totals.items():
+        processed_data[year] = {
+            time_slot: {'average': total / count, 'total': total, 'count': count}
+            for time_slot, (total, count) in time_data.items()
+        }
+    return processed_data
+
+
+def group_detailed_historical() -> Dict[Any, List[Dict[str, Any]]]:
+    """Group per-entry data by year, sorted by timestamp"""
+    # The index keeps each year's list in timestamp order as entries arrive
+    _, by_year = load_data_index()
+    return by_year
+
+
+def historical_processed_is_current() -> bool:
+    """True if HISTORICAL_PROCESSED_FILE was written after the source file"""
+    try:
+        source = os.stat(HISTORICAL_DATA_FILE)
+        processed = os.stat(HISTORICAL_PROCESSED_FILE)
+    except FileNotFoundError:
+        return False
+    return processed.st_mtime_ns >= source.st_mtime_ns
+
+
+def historical_gzip_is_current() -> bool:
+    """True if the gzip copy was written after HISTORICAL_PROCESSED_FILE"""
+    try:
+        processed = os.stat(HISTORICAL_PROCESSED_FILE)
+        compressed = os.stat(HISTORICAL_PROCESSED_GZ_FILE)
+    except FileNotFoundError:
+        return False
+    return compressed.st_mtime_ns >= processed.st_mtime_ns
+
+
+def refresh_historical_processed(historical: Optional[List[Dict[str, Any]]] = None):
+    """Rewrite HISTORICAL_PROCESSED_FILE from the source if it is stale.
+
+    archive_year passes the list it just wrote so it isn't parsed again.
+    """
+    try:
+        with file_lock(HISTORICAL_PROCESSED_FILE):
+            if not os.path.exists(HISTORICAL_DATA_FILE) or historical_processed_is_current():
+                return
+            payload = orjson.dumps(group_historical_data(historical), option=orjson.OPT_NON_STR_KEYS)
+            atomic_write(HISTORICAL_PROCESSED_FILE, payload)
+            # Written second, so a gzip copy at least as new is never stale
+            atomic_write(HISTORICAL_PROCESSED_GZ_FILE, gzip.compress(payload, compresslevel=9))
+            logger.info("Rebuilt %s", HISTORICAL_PROCESSED_FILE)
+    except Exception as e:
+        logger.error("Failed to rebuild processed historical data: %s", e)
+
+
+def _refresh_historical_in_background():
+    """Start at most one background rebuild per worker"""
+    if not _HIST_REFRESH_LOCK.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            refresh_historical_processed()
+        finally:
+            _HIST_REFRESH_LOCK.release()
+
+    threading.Thread(target=run, daemon=True).start()
 
 
 @app.route('/historical_data')
@@ -274,64 +1064,25 @@ def get_historical_data():
     """Serve historical data grouped by year and time of day"""
     try:
         if not os.path.exists(HISTORICAL_DATA_FILE):
-            return jsonify({})
-        
-        with open(HISTORICAL_DATA_FILE, 'r') as f:
-            data = json.load(f)
-        
-        # Group data by year and time of day
-        grouped_data = {}
-        for entry in data:
-            year = entry['year']
-            timestamp_str = entry['timestamp']
-            
-            # Parse timestamp - handle both UTC and legacy local timestamps
-            try:
-                if timestamp_str.endswith('Z') or '+' in timestamp_str or timestamp_str.count('-') > 2:
-                    # UTC timestamp - parse and convert to local time
-                    if timestamp_str.endswith('Z'):
-                        timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                    else:
-                        timestamp = datetime.fromisoformat(timestamp_str)
-                    
-                    # Convert UTC to local time (Eastern)
-                    # For October 31, use EDT offset (UTC-4)
-                    from datetime import timedelta
-                    local_offset = timedelta(hours=-4)  # EDT
-                    local_time = timestamp + local_offset
-                else:
-                    # Legacy local timestamp without timezone
-                    local_time = datetime.fromisoformat(timestamp_str)
-                
-                time_of_day = local_time.strftime('%H:%M')
-                
-            except Exception as e:
-                logger.warning(f"Failed to parse timestamp {timestamp_str}: {e}")
-                continue
-            
-            if year not in grouped_data:
-                grouped_data[year] = {}
-            
-            if time_of_day not in grouped_data[year]:
-                grouped_data[year][time_of_day] = []
-            
-            grouped_data[year][time_of_day].append(entry['count'])
-        
-        # Calculate averages
-        processed_data = {}
-        for year, time_data in grouped_data.items():
-            processed_data[year] = {}
-            for time_slot, counts in time_data.items():
-                processed_data[year][time_slot] = {
-                    'average': sum(counts) / len(counts),
-                    'total': sum(counts),
-                    'count': len(counts)
-                }
-        
-        return jsonify(processed_data)
+            return json_response({})
+        if historical_processed_is_current():
+            if 'gzip' in request.accept_encodings and historical_gzip_is_current():
+                response = send_file(os.path.abspath(HISTORICAL_PROCESSED_GZ_FILE),
+                                     mimetype='application/json', conditional=True,
+                                     max_age=HISTORICAL_MAX_AGE)
+                response.headers['Content-Encoding'] = 'gzip'
+            else:
+                response = send_file(os.path.abspath(HISTORICAL_PROCESSED_FILE),
+                                     mimetype='application/json', conditional=True,
+                                     max_age=HISTORICAL_MAX_AGE)
+            response.vary.add('Accept-Encoding')
+            return response
+        # Stale or missing blob: answer from the in-memory path this time
+        _refresh_historical_in_background()
+        return cached_file_response(HISTORICAL_DATA_FILE, group_historical_data)
     except Exception as e:
-        logger.error(f"Error loading historical data: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error loading historical data: %s", e)
+        return json_response({'error': str(e)}, 500)
     
 
 @app.route('/detailed_historical')
@@ -340,35 +1091,31 @@ def get_detailed_historical():
     """Serve detailed per-entry historical data grouped by year."""
     try:
         if not os.path.exists(DATA_FILE):
-            return jsonify({})
-
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-
-        grouped = {}
-        for entry in data:
-            year = entry.get('year')
-            if year not in grouped:
-                grouped[year] = []
-            grouped[year].append(entry)
-
-        # Sort entries per year by timestamp
-        for year, entries in grouped.items():
-            try:
-                entries.sort(key=lambda e: e.get('timestamp'))
-            except Exception:
-                pass
-
-        return jsonify(grouped)
+            return Response(EMPTY_DICT_JSON, mimetype='application/json')
+        return cached_file_response(DATA_FILE, group_detailed_historical,
+                                    signature=data_index_version())
     except Exception as e:
-        logger.error(f"Error loading detailed historical data: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error loading detailed historical data: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 @app.errorhandler(RateLimitExceeded)
 def handle_rate_limit(e):
     """Return JSON for rate-limited responses instead of HTML so clients can parse errors."""
     # e.description may contain details depending on limiter setup
-    return jsonify({'error': 'rate_limited', 'message': str(e)}), 429
+    return json_response({'error': 'rate_limited', 'message': str(e)}, 429)
+
+
+def current_year_response() -> Response:
+    """This year's entries as a cached response, revalidated via ETag.
+
+    The browser re-sends the ETag on each poll, so while nothing new has been
+    recorded the reply is an empty 304.
+    """
+    if not os.path.exists(DATA_FILE):
+        return Response(EMPTY_LIST_JSON, mimetype='application/json')
+    year = current_year()
+    return cached_file_response(DATA_FILE, lambda: load_data_index()[1].get(year, []),
+                                key=('current_year', year), signature=data_index_version())
 
 
 @app.route('/current_data')
@@ -379,15 +1126,12 @@ def get_current_data():
         # Use authoritative file state to check live mode
         current = load_live_mode_from_file()
         if not current.get('enabled', False):
-            return jsonify([])
+            return Response(EMPTY_LIST_JSON, mimetype='application/json')
         
-        data = load_data()
-        current_year = datetime.now().year
-        current_year_data = [entry for entry in data if entry.get('year') == current_year]
-        return jsonify(current_year_data)
+        return current_year_response()
     except Exception as e:
-        logger.error(f"Error loading current data: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error loading current data: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 
 @app.route('/add_trick_or_treater', methods=['POST'])
@@ -396,54 +1140,62 @@ def get_current_data():
 def add_trick_or_treater():
     """Add a trick-or-treater count"""
     try:
-        data = load_data()
-        
+        now = datetime.now(timezone.utc)
         new_entry = {
-            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'timestamp': now.isoformat(),
+            # Numeric copy so readers can compare times without parsing
+            'ts_epoch': now.timestamp(),
             'count': 1,
-            'year': datetime.now().year
+            'year': current_year()
         }
         
-        data.append(new_entry)
-        save_data(data)
+        queue_append([new_entry])
+        total_count = count_entries()
         
-        logger.info(f"Trick-or-treater added. Total count: {len(data)}")
+        logger.info("Trick-or-treater added. Total count: %s", total_count)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'message': 'Trick-or-treater added',
-            'total_count': len(data)
+            'total_count': total_count
         })
     except Exception as e:
-        logger.error(f"Error adding trick-or-treater: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error adding trick-or-treater: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 
 @app.route('/undo_last_entry', methods=['POST'])
 @require_api_key
 @limiter.limit("30 per minute")
+@file_lock(DATA_FILE)
 def undo_last_entry():
     """Undo the last trick-or-treater entry"""
     try:
-        data = load_data()
-        
-        if not data:
-            return jsonify({'error': 'No entries to undo'}), 400
-        
-        removed_entry = data.pop()
-        save_data(data)
+        try:
+            removed_entry = remove_last_entry()
+        except FileNotFoundError:
+            removed_entry = None
+        except orjson.JSONDecodeError:
+            # Torn final line - fall back to rewriting from the parsed entries
+            data = load_data()
+            removed_entry = data.pop() if data else None
+            if removed_entry is not None:
+                save_data(data)
+
+        if removed_entry is None:
+            return json_response({'error': 'No entries to undo'}, 400)
         
-        logger.info(f"Last entry removed: {removed_entry}")
+        logger.info("Last entry removed: %s", removed_entry)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'message': 'Last entry removed',
             'removed_entry': removed_entry,
-            'total_count': len(data)
+            'total_count': count_entries()
         })
     except Exception as e:
-        logger.error(f"Error undoing entry: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error undoing entry: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 
 @app.route('/upload_batch', methods=['POST'])
@@ -452,26 +1204,39 @@ def undo_last_entry():
 def upload_batch():
     """Upload a batch of data (for syncing pending local data)"""
     try:
-        body = request.get_json()
-        batch_data = body.get('data', [])
+        body = request.get_json(silent=True)
+        batch_data = body.get('data', []) if isinstance(body, dict) else None
         
         if not batch_data:
-            return jsonify({'error': 'No data provided'}), 400
+            return json_response({'error': 'No data provided'}, 400)
+        if not isinstance(batch_data, list):
+            return json_response({'error': 'data must be a list of entries'}, 400)
         
-        existing_data = load_data()
-        existing_data.extend(batch_data)
-        save_data(existing_data)
+        for entry in batch_data:
+            try:
+                timestamp = datetime.fromisoformat(entry['timestamp'])
+            except (KeyError, TypeError, ValueError):
+                return json_response({'error': 'Each entry needs an ISO 8601 timestamp'}, 400)
+            # Parse once here so /stats never has to, and never trust a
+            # client-sent ts_epoch. Naive (legacy local) timestamps get none:
+            # archive_year keys them by its absence and must keep them naive.
+            entry.pop('ts_epoch', None)
+            if timestamp.tzinfo is not None:
+                entry['ts_epoch'] = timestamp.timestamp()
+        # Keep each appended run chronological for the readers
+        batch_data = sorted(batch_data, key=entry_sort_key)
+        append_data(batch_data)
         
-        logger.info(f"Batch upload: {len(batch_data)} entries added")
+        logger.info("Batch upload: %s entries added", len(batch_data))
         
-        return jsonify({
+        return json_response({
             'success': True,
             'message': f'{len(batch_data)} entries uploaded',
-            'total_count': len(existing_data)
+            'total_count': count_entries()
         })
     except Exception as e:
-        logger.error(f"Error uploading batch: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error uploading batch: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 
 @app.route('/stats')
@@ -479,78 +1244,37 @@ def upload_batch():
 def get_stats():
     """Get current statistics"""
     try:
-        data = load_data()
-        if not data:
-            # Return empty stats if no data
-            current = load_live_mode_from_file()
-            return jsonify({
-                'total_count': 0,
-                'recent_count': 0,
-                'serial_connected': True,
-                'live_mode': current.get('enabled', False)
-            })
-        
-        current_year = datetime.now().year
-        current_year_data = [e for e in data if e.get('year') == current_year]
-        
-        # Count recent entries (last 5 minutes)
-        recent_time_utc = datetime.now(timezone.utc) - timedelta(minutes=5)
-        recent_count = 0
-        
-        for e in current_year_data:
-            timestamp_str = e.get('timestamp')
-            if not timestamp_str:
-                continue
-                
-            try:
-                # Parse timestamp - handle multiple formats
-                if timestamp_str.endswith('Z'):
-                    # UTC with Z suffix
-                    entry_time = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-                elif '+' in timestamp_str or timestamp_str.count('-') > 2:
-                    # Has timezone offset
-                    entry_time = datetime.fromisoformat(timestamp_str)
-                else:
-                    # No timezone info - assume UTC
-                    entry_time = datetime.fromisoformat(timestamp_str).replace(tzinfo=timezone.utc)
-                
-                # Ensure timezone-aware for comparison
-                if entry_time.tzinfo is None:
-                    entry_time = entry_time.replace(tzinfo=timezone.utc)
-                elif entry_time.tzinfo != timezone.utc:
-                    entry_time = entry_time.astimezone(timezone.utc)
-                
-                if entry_time > recent_time_utc:
-                    recent_count += 1
-                    
-            except (ValueError, AttributeError) as e:
-                logger.debug(f"Skipping entry with unparseable timestamp: {timestamp_str}, error: {e}")
-                continue
+        total_count, recent_count = get_stats_counts()
         
         # Get authoritative live mode state from file
         current = load_live_mode_from_file()
-        return jsonify({
-            'total_count': len(current_year_data),
+        return json_response({
+            'total_count': total_count,
             'recent_count': recent_count,
             'serial_connected': True,
             'live_mode': current.get('enabled', False)
         })
     except Exception as e:
-        logger.exception(f"Error getting stats: {e}")
-        return jsonify({
+        logger.exception("Error getting stats: %s", e)
+        return json_response({
             'error': 'Internal server error',
             'message': str(e),
             'total_count': 0,
             'recent_count': 0,
             'serial_connected': True,
             'live_mode': False
-        }), 500
+        }, 500)
 
 @app.route('/health')
+@limiter.exempt  # probes would otherwise exhaust the default per-IP limits
 def health_check():
-    """Health check endpoint"""
-    current = load_live_mode_from_file()
-    return jsonify({
+    """Health check endpoint.
+
+    Reports the last live mode state this worker saw instead of checking
+    the file, so probes only touch the disk before the first load.
+    """
+    current = _LIVE_CACHE['state'] or load_live_mode_from_file()
+    return json_response({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
         'live_mode': current.get('enabled', False)
@@ -559,6 +1283,7 @@ def health_check():
 @app.route('/archive_year', methods=['POST'])
 @require_api_key
 @limiter.limit("10 per hour")
+@file_lock(HISTORICAL_DATA_FILE)
 def archive_year():
     """Archive current year data to historical data (call this after Halloween to prepare for next year)"""
     try:
@@ -566,49 +1291,53 @@ def archive_year():
         year = body.get('year')
         
         if not year:
-            return jsonify({'error': 'Year parameter required'}), 400
+            return json_response({'error': 'Year parameter required'}, 400)
         
         # Load current data
-        current_data = load_data()
-        year_data = [entry for entry in current_data if entry.get('year') == year]
+        _, by_year = load_data_index()
+        year_data = by_year.get(year, [])
         
         if not year_data:
-            return jsonify({'error': f'No data found for year {year}'}), 404
+            return json_response({'error': f'No data found for year {year}'}, 404)
         
         # Load historical data
         if os.path.exists(HISTORICAL_DATA_FILE):
-            with open(HISTORICAL_DATA_FILE, 'r') as f:
-                historical = json.load(f)
+            with open(HISTORICAL_DATA_FILE, 'rb') as f:
+                historical = orjson.loads(f.read())
         else:
             historical = []
         
-        # Group by 15-minute intervals and aggregate
-        interval_data = {}
+        # Group by 15-minute intervals and aggregate. Entries are folded into
+        # integer buckets of local wall-clock seconds (shifted by LOCAL_OFFSET)
+        # and each interval is only formatted once at the end. The key keeps
+        # the entry's own UTC offset (None for legacy naive timestamps).
+        shift = LOCAL_OFFSET.total_seconds()
+        bucket_counts = defaultdict(int)
         for entry in year_data:
             timestamp_str = entry['timestamp']
             try:
-                # Parse timestamp
-                if timestamp_str.endswith('Z'):
-                    timestamp = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+                epoch = entry.get('ts_epoch')
+                if isinstance(epoch, (int, float)) and timestamp_str.endswith(('+00:00', 'Z')):
+                    # Live adds are UTC - no need to parse the string
+                    offset = timedelta(0)
                 else:
                     timestamp = datetime.fromisoformat(timestamp_str)
-                
-                # Convert to local time (EDT for October 31)
-                local_offset = timedelta(hours=-4)  # EDT
-                local_time = timestamp + local_offset
-                
-                # Round to 15-minute interval
-                minutes = (local_time.minute // 15) * 15
-                interval_time = local_time.replace(minute=minutes, second=0, microsecond=0)
-                interval_key = interval_time.isoformat()
-                
-                if interval_key not in interval_data:
-                    interval_data[interval_key] = 0
-                interval_data[interval_key] += entry.get('count', 1)
-                
+                    offset = timestamp.utcoffset()
+                    if offset is None:
+                        timestamp = timestamp.replace(tzinfo=timezone.utc)
+                    epoch = timestamp.timestamp()
+                wall = epoch + shift + (offset or timedelta(0)).total_seconds()
+                bucket = int(wall // 900) * 900
+                bucket_counts[(bucket, offset)] += entry.get('count', 1)
             except Exception as e:
-                logger.warning(f"Failed to parse timestamp {timestamp_str}: {e}")
+                logger.warning("Failed to parse timestamp %s: %s", timestamp_str, e)
                 continue
+
+        interval_data = {}
+        for (bucket, offset), count in bucket_counts.items():
+            interval_time = datetime.fromtimestamp(bucket, timezone.utc).replace(
+                tzinfo=None if offset is None else timezone(offset))
+            interval_data[interval_time.isoformat()] = count
         
         # Add aggregated data to historical
         for interval_time, count in interval_data.items():
@@ -619,33 +1348,30 @@ def archive_year():
             })
         
         # Save historical data
-        with open(HISTORICAL_DATA_FILE, 'w') as f:
-            json.dump(historical, f, indent=2)
+        atomic_write(HISTORICAL_DATA_FILE, orjson.dumps(historical))
+        refresh_historical_processed(historical)
         
-        logger.info(f"Archived {len(interval_data)} intervals for year {year}")
+        logger.info("Archived %s intervals for year %s", len(interval_data), year)
         
-        return jsonify({
+        return json_response({
             'success': True,
             'message': f'Archived {len(interval_data)} time intervals for year {year}',
             'intervals_archived': len(interval_data)
         })
         
     except Exception as e:
-        logger.error(f"Error archiving year: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error archiving year: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 @app.route('/current_year_data')
 @limiter.limit("1000 per hour")
 def get_current_year_data():
     """Get current year's data regardless of live mode status - used for summary generation"""
     try:
-        data = load_data()
-        current_year = datetime.now().year
-        current_year_data = [entry for entry in data if entry.get('year') == current_year]
-        return jsonify(current_year_data)
+        return current_year_response()
     except Exception as e:
-        logger.error(f"Error loading current year data: {e}")
-        return jsonify({'error': str(e)}), 500
+        logger.error("Error loading current year data: %s", e)
+        return json_response({'error': str(e)}, 500)
 
 @app.route('/weather', methods=['GET', 'POST'])
 @limiter.limit("10 per hour")
@@ -655,9 +1381,8 @@ def weather():
     
     if request.method == 'POST':
         # Only allow setting weather with API key
-        api_key = request.headers.get('X-API-Key')
-        if not (api_key and api_key == API_KEY):
-            return jsonify({'error': 'Unauthorized'}), 401
+        if not api_key_valid(request.headers.get('X-API-Key')):
+            return json_response({'error': 'Unauthorized'}, 401)
         
         try:
             body = request.get_json(silent=True) or {}
@@ -667,39 +1392,44 @@ def weather():
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
             
-            with open(WEATHER_FILE, 'w') as f:
-                json.dump(weather_data, f, indent=2)
+            atomic_write(WEATHER_FILE, orjson.dumps(weather_data))
             
-            logger.info(f"Weather updated: {weather_data}")
-            return jsonify(weather_data)
+            logger.info("Weather updated: %s", weather_data)
+            return json_response(weather_data)
         except Exception as e:
-            logger.error(f"Error updating weather: {e}")
-            return jsonify({'error': str(e)}), 500
+            logger.error("Error updating weather: %s", e)
+            return json_response({'error': str(e)}, 500)
     
     else:  # GET
         try:
             if os.path.exists(WEATHER_FILE):
-                with open(WEATHER_FILE, 'r') as f:
-                    return jsonify(json.load(f))
+                with open(WEATHER_FILE, 'rb') as f:
+                    return json_response(orjson.loads(f.read()))
             else:
-                return jsonify({
+                return json_response({
                     'condition': 'Unknown',
                     'temperature': 0,
                     'timestamp': None
                 })
         except Exception as e:
-            logger.error(f"Error loading weather: {e}")
-            return jsonify({'error': str(e)}), 500
+            logger.error("Error loading weather: %s", e)
+            return json_response({'error': str(e)}, 500)
 
 
 def create_app():
     """Factory function to create the Flask app instance.
     This is useful for gunicorn and other WSGI servers."""
+    if os.environ.get('FLASK_ENV') == 'production' and API_KEY in ('', DEFAULT_API_KEY):
+        raise RuntimeError('DASHBOARD_API_KEY must be set to a real key in production')
+    start_data_watcher()
     # Ensure live mode is initialized
     initialize_live_mode()
+    refresh_historical_processed()
     return app
 
 if __name__ == '__main__':
-    # For production, use a production WSGI server like gunicorn
-    # gunicorn -w 4 -b 0.0.0.0:8000 'app:create_app()'
+    # Development server only. For production use gunicorn with threads, e.g.
+    # gunicorn -w 1 --threads 8 -b 0.0.0.0:8000 'app:create_app()'
+    # Don't add --preload: create_app starts the watcher thread, which would
+    # stay behind in the master instead of running in each worker.
     create_app().run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
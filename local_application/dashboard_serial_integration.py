@@ -8,10 +8,21 @@
 # email dvanvolk@ieee.org
 # -----------------------------------------------------------
 
+import bisect
 import json
+import logging
+import os
 import threading
 import time
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows; locking degrades to a no-op there
+    fcntl = None
+
 # Import RadioInterface robustly so this module can be imported either as
 # a package (package-relative imports) or run directly as a script from the
 # `local_application` folder (plain imports). This mirrors patterns used
@@ -25,6 +36,34 @@ except Exception:
     except Exception:
         RadioInterface = None
 
+logger = logging.getLogger(__name__)
+
+# One JSON object per line, the same append-only format the dashboard uses.
+# Entries from the older whole-list JSON file are migrated on first load.
+DATA_FILE = os.path.join('data', 'trickortreat_data.jsonl')
+LEGACY_DATA_FILE = os.path.join('data', 'trickortreat_data.json')
+
+# fdatasync skips the metadata flush fsync does, but isn't available on Windows or macOS
+_fdatasync = getattr(os, 'fdatasync', os.fsync)
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock on path + '.lock'.
+
+    The same companion lock the dashboard server takes around its own
+    appends, undo truncations and rewrites of the data file, so a press
+    here can't interleave with one of those.
+    """
+    with open(path + '.lock', 'a') as lf:
+        if fcntl is not None:
+            fcntl.flock(lf.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lf.fileno(), fcntl.LOCK_UN)
+
 class DashboardSerialIntegration:
     def __init__(self, serial_port="COM7"):
         """Initialize the serial integration with the dashboard"""
@@ -32,6 +71,15 @@ class DashboardSerialIntegration:
         self.serial_radio = RadioInterface()
         self.current_data = []
         self.data_lock = threading.Lock()
+        self._log_fp = None
+        self._total = 0  # running sum of entry counts
+        # Entry times in ascending order, with _cum[i] the summed count of the
+        # first i of them, so a recent count is one bisect and a subtraction
+        self._times = []
+        self._cum = [0]
+        # Bumped on every change; _snapshot caches current_data as a tuple
+        self._version = 0
+        self._snapshot = None
         
         # Set up button callbacks
         button_callbacks = [
@@ -45,7 +93,7 @@ class DashboardSerialIntegration:
             raise RuntimeError("RadioInterface could not be imported; cannot start serial integration")
 
         self.serial_radio.start(self.serial_port, button_callbacks=button_callbacks)
-        print(f"Serial interface started on {self.serial_port}")
+        logger.info("Serial interface started on %s", self.serial_port)
         
     def __count_btn_callback(self):
         """Callback when the count button is pressed - add a new trick-or-treater"""
@@ -53,72 +101,207 @@ class DashboardSerialIntegration:
         timestamp = now.isoformat(timespec='microseconds')  # Local time with timezone info
         new_entry = {
             "timestamp": timestamp,
+            # Numeric copy so recent counts compare floats instead of parsing
+            "ts_epoch": now.timestamp(),
             "count": 1,
             "year": now.year
         }
         
         with self.data_lock:
             self.current_data.append(new_entry)
-            self.__save_current_data()
+            self._total += new_entry['count']
+            if not self._times or new_entry['ts_epoch'] >= self._times[-1]:
+                self._times.append(new_entry['ts_epoch'])
+                self._cum.append(self._cum[-1] + new_entry['count'])
+            else:
+                # Clock stepped backwards - re-sort
+                self.__rebuild_time_index()
+            self.__data_changed()
+            self.__append_entry(new_entry)
         
-        print(f"{datetime.now()} New Trick-or-Treater added via button press")
+        logger.info("New Trick-or-Treater added via button press at %s", timestamp)
         
     def __undo_btn_callback(self):
         """Callback when the undo button is pressed - remove the last entry"""
         with self.data_lock:
             if self.current_data:
                 removed_entry = self.current_data.pop()
-                self.__save_current_data()
-                print(f"{datetime.now()} Removed last trick-or-treater entry")
+                self._total -= removed_entry.get('count', 0)
+                removed_ts = removed_entry.get('ts_epoch')
+                if (removed_ts is not None and self._times and self._times[-1] == removed_ts
+                        and self._cum[-1] - self._cum[-2] == removed_entry.get('count', 0)):
+                    self._times.pop()
+                    self._cum.pop()
+                elif removed_ts is not None:
+                    # Not the newest entry (e.g. loaded out of order) - re-sort
+                    self.__rebuild_time_index()
+                self.__data_changed()
+                self.__remove_last_line()
+                logger.info("Removed last trick-or-treater entry")
             else:
-                print(f"{datetime.now()} No entries to remove")
+                logger.info("No entries to remove")
     
-    def __save_current_data(self):
-        """Save the current data to the JSON file"""
+    def __data_changed(self):
+        """Invalidate the cached snapshot after current_data changes"""
+        self._version += 1
+        self._snapshot = None
+
+    def __rebuild_time_index(self):
+        """Rebuild _times/_cum from current_data"""
+        timed = sorted((entry['ts_epoch'], entry.get('count', 0))
+                       for entry in self.current_data if 'ts_epoch' in entry)
+        self._times = [ts for ts, _ in timed]
+        self._cum = [0]
+        for _, count in timed:
+            self._cum.append(self._cum[-1] + count)
+
+    def __append_entry(self, entry):
+        """Append one entry to the JSONL file as a single line.
+
+        The file stays open between presses and is unbuffered, so each press
+        costs one small write() instead of rewriting every entry. It is
+        reopened if the server has since swapped in a new file.
+        """
         try:
-            with open('data/trickortreat_data.json', 'w') as f:
-                json.dump(self.current_data, f, indent=2)
+            os.makedirs(os.path.dirname(DATA_FILE), exist_ok=True)
+            with file_lock(DATA_FILE):
+                if self._log_fp is not None:
+                    try:
+                        replaced = os.fstat(self._log_fp.fileno()).st_ino != os.stat(DATA_FILE).st_ino
+                    except FileNotFoundError:
+                        replaced = True
+                    if replaced:
+                        self._log_fp.close()
+                        self._log_fp = None
+                if self._log_fp is None:
+                    self._log_fp = open(DATA_FILE, 'ab', buffering=0)
+                self._log_fp.write((json.dumps(entry) + '\n').encode('utf-8'))
         except Exception as e:
-            print(f"Error saving current data: {e}")
-    
+            logger.error("Error saving current data: %s", e)
+
+    def __remove_last_line(self):
+        """Truncate the final line off the JSONL file"""
+        try:
+            with file_lock(DATA_FILE), open(DATA_FILE, 'r+b') as f:
+                pos = f.seek(0, os.SEEK_END)
+                tail = b''
+                # Read backwards until the start of the last line is in view
+                while pos > 0 and b'\n' not in tail.rstrip():
+                    step = min(4096, pos)
+                    pos -= step
+                    f.seek(pos)
+                    tail = f.read(step) + tail
+                body = tail.rstrip()
+                f.truncate(pos + body.rfind(b'\n') + 1)
+        except Exception as e:
+            logger.error("Error saving current data: %s", e)
+
+    def __migrate_legacy_data(self):
+        """Convert the legacy JSON list file to JSONL if no JSONL file exists yet.
+
+        Written to a temp file and renamed into place under the data file's
+        lock, so the dashboard server never sees a half-written file and
+        only one of the two migrates.
+        """
+        with open(LEGACY_DATA_FILE, 'r') as f:
+            legacy = json.load(f)
+        with file_lock(DATA_FILE):
+            if os.path.exists(DATA_FILE):
+                return  # the server migrated first
+            tmp = f"{DATA_FILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, 'w') as f:
+                    f.writelines(json.dumps(entry) + '\n' for entry in legacy)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, DATA_FILE)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+        logger.info("Migrated %d entries from %s", len(legacy), LEGACY_DATA_FILE)
+
     def load_current_data(self):
-        """Load existing current data from the JSON file"""
+        """Load existing current data from the JSONL file"""
         try:
-            with open('data/trickortreat_data.json', 'r') as f:
-                self.current_data = json.load(f)
-            print(f"Loaded {len(self.current_data)} existing entries")
+            if not os.path.exists(DATA_FILE) and os.path.exists(LEGACY_DATA_FILE):
+                self.__migrate_legacy_data()
+            entries = []
+            with open(DATA_FILE, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning("Skipping malformed data line: %r", line[:200])
+                        continue
+                    if 'ts_epoch' not in entry:
+                        # Older entries only carry the ISO string - parse it once here
+                        try:
+                            entry['ts_epoch'] = datetime.fromisoformat(
+                                entry['timestamp'].replace('Z', '+00:00')).timestamp()
+                        except (KeyError, ValueError, AttributeError):
+                            pass
+                    entries.append(entry)
+            self.current_data = entries
+            self._total = sum(entry.get('count', 0) for entry in entries)
+            self.__rebuild_time_index()
+            logger.info("Loaded %d existing entries", len(self.current_data))
         except FileNotFoundError:
             self.current_data = []
-            print("No existing data found, starting fresh")
+            self._total = 0
+            self.__rebuild_time_index()
+            logger.info("No existing data found, starting fresh")
         except Exception as e:
-            print(f"Error loading current data: {e}")
+            logger.error("Error loading current data: %s", e)
             self.current_data = []
+            self._total = 0
+            self.__rebuild_time_index()
+        self.__data_changed()
     
     def get_current_data(self):
         """Get a copy of the current data"""
         with self.data_lock:
             return self.current_data.copy()
+
+    def get_data_snapshot(self, known_version=None):
+        """Get (version, entries) without copying the list on every call.
+
+        entries is a tuple shared by all callers until the data next changes.
+        Returns None when known_version is still current, so a poller can
+        skip re-reading unchanged data.
+        """
+        with self.data_lock:
+            if known_version == self._version:
+                return None
+            if self._snapshot is None:
+                self._snapshot = tuple(self.current_data)
+            return self._version, self._snapshot
     
     def get_total_count(self):
         """Get the total count of trick-or-treaters"""
         with self.data_lock:
-            return sum(entry['count'] for entry in self.current_data)
+            return self._total
     
     def get_recent_count(self, minutes=5):
         """Get the count from the last N minutes"""
-        cutoff_time = datetime.now().timestamp() - (minutes * 60)
+        cutoff_time = time.time() - (minutes * 60)
         with self.data_lock:
-            recent_entries = [
-                entry for entry in self.current_data
-                if datetime.fromisoformat(entry['timestamp'].replace('Z', '+00:00')).timestamp() > cutoff_time
-            ]
-            return sum(entry['count'] for entry in recent_entries)
+            return self._cum[-1] - self._cum[bisect.bisect_right(self._times, cutoff_time)]
     
     def cleanup(self):
         """Clean up the serial interface"""
         if hasattr(self, 'serial_radio'):
             self.serial_radio.exit()
-        print("Serial interface cleaned up")
+        if self._log_fp is not None:
+            # Presses are plain writes; make the session durable once on exit
+            _fdatasync(self._log_fp.fileno())
+            self._log_fp.close()
+            self._log_fp = None
+        logger.info("Serial interface cleaned up")
 
 # Global instance for the dashboard
 dashboard_serial = None
@@ -33,6 +33,9 @@ except Exception:
 
 LOGGER = logging.getLogger("local_app")
 
+# Shared so each poll reuses the pooled TCP/TLS connection to Open-Meteo
+_SESSION = requests.Session()
+
 
 def fetch_weather(latitude: float, longitude: float) -> tuple[Optional[str], Optional[float]]:
     """Fetch weather from Open-Meteo API"""
@@ -46,7 +49,7 @@ def fetch_weather(latitude: float, longitude: float) -> tuple[Optional[str], Opt
     }
     
     try:
-        response = requests.get(url, params=params, timeout=10)
+        response = _SESSION.get(url, params=params, timeout=10)
         response.raise_for_status()
         data = response.json()
         
@@ -64,26 +67,26 @@ def fetch_weather(latitude: float, longitude: float) -> tuple[Optional[str], Opt
         return None, None
 
 
+# WMO weather code -> simple condition, flattened once at import
+WEATHER_CONDITIONS = {
+    code: condition
+    for condition, codes in (
+        ("Clear", (0,)),
+        ("Partly Cloudy", (1, 2, 3)),
+        ("Foggy", (45, 48)),
+        ("Drizzle", (51, 53, 55, 56, 57)),
+        ("Rainy", (61, 63, 65, 66, 67)),
+        ("Snowy", (71, 73, 75, 77, 85, 86)),
+        ("Showers", (80, 81, 82)),
+        ("Thunderstorm", (95, 96, 99)),
+    )
+    for code in codes
+}
+
+
 def weather_code_to_condition(code: int) -> str:
     """Convert WMO weather code to simple condition string"""
-    if code == 0:
-        return "Clear"
-    elif code in [1, 2, 3]:
-        return "Partly Cloudy"
-    elif code in [45, 48]:
-        return "Foggy"
-    elif code in [51, 53, 55, 56, 57]:
-        return "Drizzle"
-    elif code in [61, 63, 65, 66, 67]:
-        return "Rainy"
-    elif code in [71, 73, 75, 77, 85, 86]:
-        return "Snowy"
-    elif code in [80, 81, 82]:
-        return "Showers"
-    elif code in [95, 96, 99]:
-        return "Thunderstorm"
-    else:
-        return "Unknown"
+    return WEATHER_CONDITIONS.get(code, "Unknown")
 
 
 def update_dashboard_weather(api_client, condition: str, temperature: float) -> bool:
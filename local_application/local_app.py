@@ -15,7 +15,6 @@ import logging
 import os
 import signal
 import sys
-import time
 from typing import Optional
 import json
 import threading
@@ -50,8 +49,11 @@ def parse_args() -> argparse.Namespace:
     return p.parse_args()
 
 
-def start_weather_updates(api_client, config: dict, should_stop) -> None:
-    """Run weather updates in a background thread with better rate limit handling"""
+def start_weather_updates(api_client, config: dict, stop_event: threading.Event) -> None:
+    """Run weather updates in a background thread with better rate limit handling.
+
+    The thread sleeps on stop_event, so setting it ends the loop immediately.
+    """
     LOGGER.info("Starting weather update thread")
     
     latitude = config.get('latitude')
@@ -65,15 +67,21 @@ def start_weather_updates(api_client, config: dict, should_stop) -> None:
         # Track consecutive failures to implement exponential backoff
         consecutive_failures = 0
         max_failures_before_backoff = 3
+        # Last reading the dashboard accepted; unchanged readings aren't re-sent
+        last_sent = None
         
-        while not should_stop:
+        while not stop_event.is_set():
             try:
                 condition, temperature = fetch_weather(latitude, longitude)
                 
                 if condition is not None and temperature is not None:
+                    if (condition, temperature) == last_sent:
+                        LOGGER.debug(f"Weather unchanged ({condition}, {temperature}°F), not re-sending")
+                        consecutive_failures = 0
                     # Try to send to dashboard
-                    if update_dashboard_weather(api_client, condition, temperature):
+                    elif update_dashboard_weather(api_client, condition, temperature):
                         LOGGER.info(f"Weather updated: {condition}, {temperature}°F")
+                        last_sent = (condition, temperature)
                         consecutive_failures = 0  # Reset on success
                     else:
                         consecutive_failures += 1
@@ -83,21 +91,14 @@ def start_weather_updates(api_client, config: dict, should_stop) -> None:
                         if consecutive_failures >= max_failures_before_backoff:
                             backoff_minutes = min(consecutive_failures * 5, 30)  # Cap at 30 minutes
                             LOGGER.warning(f"Multiple failures detected, backing off for {backoff_minutes} minutes")
-                            for _ in range(backoff_minutes * 2):  # Check every 30 seconds
-                                if should_stop:
-                                    break
-                                time.sleep(30)
+                            stop_event.wait(backoff_minutes * 60)
                             continue
                 else:
                     LOGGER.warning("Failed to fetch weather from API")
                     consecutive_failures += 1
                 
-                # Normal sleep interval: 15 minutes
-                # But check should_stop every 30 seconds for clean shutdown
-                for _ in range(30):  # 15 minutes = 30 * 30 seconds
-                    if should_stop:
-                        break
-                    time.sleep(30)
+                # Normal sleep interval: 15 minutes (returns early on shutdown)
+                stop_event.wait(15 * 60)
                     
             except Exception as e:
                 consecutive_failures += 1
@@ -106,10 +107,7 @@ def start_weather_updates(api_client, config: dict, should_stop) -> None:
                 # Exponential backoff on errors
                 backoff_seconds = min(60 * consecutive_failures, 300)  # Cap at 5 minutes
                 LOGGER.info(f"Backing off for {backoff_seconds} seconds after error")
-                for _ in range(backoff_seconds // 30):
-                    if should_stop:
-                        break
-                    time.sleep(30)
+                stop_event.wait(backoff_seconds)
     
     weather_thread = threading.Thread(target=weather_update_loop, daemon=True)
     weather_thread.start()
@@ -169,13 +167,13 @@ def main() -> int:
     # Use the resolved values (CLI > config > env > defaults) when creating the client
     api_client = DashboardAPIClient(base_url=api_url, api_key=api_key)
 
-    should_stop = False
+    # An Event rather than a bool so the weather thread sees the change
+    stop_event = threading.Event()
     monitor = None
 
     def _signal_handler(sig, frame):
-        nonlocal should_stop
         LOGGER.info("Received signal to stop (%s)", sig)
-        should_stop = True
+        stop_event.set()
         # If the monitor is running, request it to exit cleanly
         try:
             if monitor is not None:
@@ -190,7 +188,7 @@ def main() -> int:
     weather_thread = None
     try:
         # Start weather updates in both monitor and integration modes
-        weather_thread = start_weather_updates(api_client, config, should_stop)
+        weather_thread = start_weather_updates(api_client, config, stop_event)
         
         if mode == "monitor":
             monitor = LocalSerialMonitor(port=port, api_client=api_client, baudrate=baudrate, local_backup=True)
@@ -207,10 +205,13 @@ def main() -> int:
             integration = DashboardSerialIntegration(serial_port=port)
             LOGGER.info("Dashboard serial integration running (press Ctrl+C to exit)")
 
-            # Wait until signaled. Use a portable sleep loop for Windows compatibility.
+            # Wait until signaled. On POSIX a signal interrupts a plain wait() and the
+            # handler runs straight away; Windows lock waits can't be interrupted,
+            # so there the wait wakes periodically to let the handler run.
+            wake_interval = 0.5 if os.name == 'nt' else None
             try:
-                while not should_stop:
-                    time.sleep(0.5)
+                while not stop_event.wait(wake_interval):
+                    pass
                 # If a monitor was created elsewhere, request it to exit.
                 if monitor is not None:
                     monitor.exit_app()
@@ -8,6 +8,7 @@ import serial
 import time
 import json
 import os
+import re
 from datetime import datetime, timezone
 from typing import Optional, TYPE_CHECKING
 
@@ -24,6 +25,19 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Button index in radio messages such as 'Button 1' or 'Button: 3'
+BUTTON_INDEX_RE = re.compile(r"\d+")
+
+# Seconds a serial read blocks waiting for a line. Also bounds how late the
+# periodic health check in run() can be.
+SERIAL_READ_TIMEOUT = 0.5
+
+# The backup is only read by this module, so skip json's default padding
+BACKUP_SEPARATORS = (',', ':')
+
+# Most pending entries sent to /upload_batch in one request
+SYNC_BATCH_MAX = 500
+
 
 class LocalSerialMonitor:
     """Monitors local serial port and sends data to remote dashboard"""
@@ -45,13 +59,17 @@ class LocalSerialMonitor:
         self.local_backup = local_backup
         self.serial_conn: Optional[serial.Serial] = None
         self.is_running = False
-        self.local_data_file = 'data/trickortreat_data_backup.json'
+        # One JSON object per line, so a backup is an append rather than a rewrite
+        self.local_data_file = 'data/trickortreat_data_backup.jsonl'
+        self.legacy_data_file = 'data/trickortreat_data_backup.json'
+        self._backup_fp = None  # opened on the first backup, kept until close_backup()
         # Track whether this monitor enabled live mode so we don't
         # accidentally disable live mode another client enabled.
         self._live_was_enabled_by_me = False
 
         # Create data directory if it doesn't exist
         os.makedirs('data', exist_ok=True)
+        self.migrate_legacy_backup()
         # Unique client id for ownership of live mode (hostname:pid:timestamp)
         try:
             import socket, os as _os
@@ -65,7 +83,7 @@ class LocalSerialMonitor:
             self.serial_conn = serial.Serial(
                 port=self.port,
                 baudrate=self.baudrate,
-                timeout=1
+                timeout=SERIAL_READ_TIMEOUT
             )
             logger.info(f"✓ Connected to {self.port}")
             return True
@@ -82,30 +100,111 @@ class LocalSerialMonitor:
             self.serial_conn.close()
             logger.info("Serial port closed")
     
+    def migrate_legacy_backup(self):
+        """Convert the old whole-list JSON backup to JSONL once"""
+        if os.path.exists(self.local_data_file) or not os.path.exists(self.legacy_data_file):
+            return
+        try:
+            with open(self.legacy_data_file, 'r') as f:
+                all_data = json.load(f)
+            self.write_backup(all_data)
+            logger.info(f"Migrated {len(all_data)} backup entries to {self.local_data_file}")
+        except Exception as e:
+            logger.error(f"Failed to migrate legacy backup: {e}")
+
+    def iter_backup(self):
+        """Yield entries from the JSONL backup one at a time, skipping torn lines"""
+        with open(self.local_data_file, 'r') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping malformed backup line: {line[:200]!r}")
+
+    def write_backup(self, all_data: list):
+        """Atomically replace the JSONL backup with all_data"""
+        self.replace_backup(json.dumps(entry, separators=BACKUP_SEPARATORS) + '\n'
+                            for entry in all_data)
+
+    def replace_backup(self, lines):
+        """Write lines to a temp file, then swap it in for the backup"""
+        tmp = self.local_data_file + '.tmp'
+        with open(tmp, 'w') as f:
+            f.writelines(lines)
+        # The open append handle would keep writing to the replaced file
+        self.close_backup()
+        os.replace(tmp, self.local_data_file)
+
+    def clear_pending_flags(self, count: int):
+        """Clear pending_upload on the first count pending entries.
+
+        Streams the backup into the replacement file; only the lines being
+        changed are decoded and re-encoded, the rest are copied as-is.
+        """
+        def lines():
+            remaining = count
+            with open(self.local_data_file, 'r') as f:
+                for line in f:
+                    if remaining and '"pending_upload"' in line:
+                        try:
+                            entry = json.loads(line)
+                        except json.JSONDecodeError:
+                            entry = None
+                        if entry is not None and entry.get('pending_upload'):
+                            entry['pending_upload'] = False
+                            line = json.dumps(entry, separators=BACKUP_SEPARATORS) + '\n'
+                            remaining -= 1
+                    yield line
+        self.replace_backup(lines())
+
+    def close_backup(self):
+        """Close the backup append handle if it is open"""
+        if self._backup_fp is not None:
+            self._backup_fp.close()
+            self._backup_fp = None
+
     def save_local_backup(self, data: dict):
         """Save data locally as backup"""
         if not self.local_backup:
             return
         
         try:
-            # Load existing data
-            if os.path.exists(self.local_data_file):
-                with open(self.local_data_file, 'r') as f:
-                    all_data = json.load(f)
-            else:
-                all_data = []
-            
-            # Append new data
-            all_data.append(data)
-            
-            # Save back to file
-            with open(self.local_data_file, 'w') as f:
-                json.dump(all_data, f, indent=2)
+            # Append one line; earlier entries are never re-read or rewritten.
+            # Line buffering hands each entry to the OS as soon as it is written.
+            if self._backup_fp is None:
+                self._backup_fp = open(self.local_data_file, 'a', buffering=1)
+            self._backup_fp.write(json.dumps(data, separators=BACKUP_SEPARATORS) + '\n')
             
             logger.debug(f"Saved backup to {self.local_data_file}")
         except Exception as e:
             logger.error(f"Failed to save local backup: {e}")
     
+    def record_count(self, source: str = ''):
+        """Send one count to the server and back it up locally.
+
+        The backup entry is built once from a single clock read and only
+        flagged pending_upload when the server call failed.
+        """
+        result = self.api_client.add_trick_or_treater()
+        if result:
+            logger.info(f"✓ Trick-or-treater counted successfully{source}")
+        else:
+            logger.error(f"✗ Failed to send count to server (saved locally){source}")
+        if not self.local_backup:
+            return
+        now = datetime.now(timezone.utc)
+        data = {
+            'timestamp': now.isoformat(),
+            'count': 1,
+            'year': now.astimezone().year
+        }
+        if not result:
+            # Still save locally if server is unreachable
+            data['pending_upload'] = True
+        self.save_local_backup(data)
+
     def handle_button_press(self, button_type: str):
         """Handle button press from serial input"""
         # Normalize input
@@ -113,40 +212,14 @@ class LocalSerialMonitor:
 
         # Support different serial formats: 'COUNT'/'UNDO' (legacy),
         # or radio messages like 'Button 1', 'Button: 1', etc.
-        import re
         if b.upper() == 'COUNT':
-            # Add trick-or-treater
-            result = self.api_client.add_trick_or_treater()
-            
-            if result:
-                logger.info("✓ Trick-or-treater counted successfully")
-                
-                # Save local backup
-                if self.local_backup:
-                    data = {
-                        'timestamp': datetime.now(timezone.utc).isoformat(),
-                        'count': 1,
-                        'year': datetime.now().year
-                    }
-                    self.save_local_backup(data)
-            else:
-                logger.error("✗ Failed to send count to server (saved locally)")
-                # Still save locally if server is unreachable
-                if self.local_backup:
-                    data = {
-                        'timestamp': datetime.now().isoformat(),
-                        'count': 1,
-                        'year': datetime.now().year,
-                        'pending_upload': True
-                    }
-                    self.save_local_backup(data)
-        
+            self.record_count()
             return
 
         # Handle 'Button' style messages
         if b.startswith('Button') or b.startswith('button'):
             # extract first integer
-            m = re.search(r"\d+", b)
+            m = BUTTON_INDEX_RE.search(b)
             if not m:
                 logger.warning(f"Received Button message with no index: '{b}'")
                 return
@@ -158,26 +231,7 @@ class LocalSerialMonitor:
 
             # Map button numbers to actions: 1 -> COUNT, 3 -> UNDO (2 unused)
             if idx == 1:
-                result = self.api_client.add_trick_or_treater()
-                if result:
-                    logger.info("✓ Trick-or-treater counted successfully (button)")
-                    if self.local_backup:
-                        data = {
-                            'timestamp': datetime.now().isoformat(),
-                            'count': 1,
-                            'year': datetime.now().year
-                        }
-                        self.save_local_backup(data)
-                else:
-                    logger.error("✗ Failed to send count to server (saved locally) (button)")
-                    if self.local_backup:
-                        data = {
-                            'timestamp': datetime.now().isoformat(),
-                            'count': 1,
-                            'year': datetime.now().year,
-                            'pending_upload': True
-                        }
-                        self.save_local_backup(data)
+                self.record_count(' (button)')
                 return
             elif idx == 3:
                 result = self.api_client.undo_last_entry()
@@ -203,16 +257,22 @@ class LocalSerialMonitor:
         logger.debug(f"Unhandled button input: '{button_type}'")
     
     def read_serial(self):
-        """Read data from serial port"""
+        """Read data from serial port.
+
+        Blocks until a full line arrives or the port timeout expires, so the
+        caller's loop doesn't need its own sleep.
+        """
         if not self.serial_conn or not self.serial_conn.is_open:
+            time.sleep(SERIAL_READ_TIMEOUT)  # nothing to block on; keep the loop's pace
             return None
         
         try:
-            if self.serial_conn.in_waiting > 0:
-                line = self.serial_conn.readline().decode('utf-8').strip()
-                return line
+            line = self.serial_conn.readline()
+            if line:
+                return line.decode('utf-8').strip()
         except Exception as e:
             logger.error(f"Error reading serial: {e}")
+            time.sleep(SERIAL_READ_TIMEOUT)
         
         return None
     
@@ -228,8 +288,12 @@ class LocalSerialMonitor:
         self.is_running = True
         logger.info("Starting serial monitor... Press Ctrl+C to stop")
 
-        last_health_check = time.time()
+        last_health_check = time.monotonic()
         health_check_interval = 60  # Check every 60 seconds
+        # After a failed check or live-mode call the interval doubles up to
+        # this cap, and resets once the server answers normally again
+        max_health_check_interval = 300
+        check_interval = health_check_interval
 
         # Try a few times at startup to enable live mode, backing off on failure.
         max_health_attempts = 5
@@ -261,7 +325,8 @@ class LocalSerialMonitor:
         try:
             while self.is_running:
                 # Periodic health check
-                if time.time() - last_health_check > health_check_interval:
+                if time.monotonic() - last_health_check > check_interval:
+                    failed = False
                     if self.api_client.health_check():
                         logger.debug("Server health check: OK")
                         # Verify live mode status matches what we expect
@@ -275,6 +340,7 @@ class LocalSerialMonitor:
                                     logger.info("✓ Live mode re-enabled successfully")
                                 else:
                                     logger.error("✗ Failed to re-enable live mode")
+                                    failed = True
                             elif not self._live_was_enabled_by_me and server_live:
                                 # Another client may be running - don't interfere
                                 logger.info("Server shows live mode enabled by another client")
@@ -287,17 +353,22 @@ class LocalSerialMonitor:
                                 self._live_was_enabled_by_me = True
                             else:
                                 logger.warning("Post-startup attempt to enable live mode failed")
+                                failed = True
                     else:
                         logger.warning("Server health check: FAILED")
-                    last_health_check = time.time()
+                        failed = True
+                    if failed:
+                        check_interval = min(check_interval * 2, max_health_check_interval)
+                        logger.info(f"Next server check in {check_interval}s")
+                    else:
+                        check_interval = health_check_interval
+                    last_health_check = time.monotonic()
                 
                 # Read serial data
                 data = self.read_serial()
                 if data:
                     logger.info(f"Received: {data}")
                     self.handle_button_press(data)
-                
-                time.sleep(0.1)  # Small delay to prevent CPU spinning
         
         except KeyboardInterrupt:
             logger.info("\nStopping serial monitor...")
@@ -306,6 +377,7 @@ class LocalSerialMonitor:
         finally:
             self.is_running = False
             self.disconnect_serial()
+            self.close_backup()
             logger.info("Serial monitor stopped")
 
             # Disable live mode only if this monitor enabled it earlier.
@@ -317,30 +389,35 @@ class LocalSerialMonitor:
                     logger.error("✗ Failed to disable live mode")
     
     def sync_pending_data(self):
-        """Upload any pending local data to server"""
+        """Upload any pending local data to server.
+
+        Only the pending entries are held in memory. They go up in batches
+        of at most SYNC_BATCH_MAX, and the flags of those that were accepted
+        are then cleared in one streaming pass over the backup.
+        """
         if not self.local_backup or not os.path.exists(self.local_data_file):
             return
         
         try:
-            with open(self.local_data_file, 'r') as f:
-                all_data = json.load(f)
-            
             # Find pending entries
-            pending = [d for d in all_data if d.get('pending_upload')]
-            
-            if pending:
-                logger.info(f"Found {len(pending)} pending entries to upload")
-                result = self.api_client.upload_data_batch(pending)
-                
-                if result:
-                    logger.info("✓ Pending data uploaded successfully")
-                    # Remove pending flag from uploaded entries
-                    for entry in all_data:
-                        if entry.get('pending_upload'):
-                            entry['pending_upload'] = False
-                    
-                    with open(self.local_data_file, 'w') as f:
-                        json.dump(all_data, f, indent=2)
+            pending = [d for d in self.iter_backup() if d.get('pending_upload')]
+            if not pending:
+                return
+
+            logger.info(f"Found {len(pending)} pending entries to upload")
+            uploaded = 0
+            for start in range(0, len(pending), SYNC_BATCH_MAX):
+                batch = pending[start:start + SYNC_BATCH_MAX]
+                if not self.api_client.upload_data_batch(batch):
+                    break
+                uploaded += len(batch)
+
+            if uploaded:
+                logger.info(f"✓ Pending data uploaded successfully ({uploaded}/{len(pending)} entries)")
+                # Remove pending flag from uploaded entries
+                self.clear_pending_flags(uploaded)
+            else:
+                logger.warning("Pending data upload failed; will retry on next sync")
         except Exception as e:
             logger.error(f"Failed to sync pending data: {e}")
     
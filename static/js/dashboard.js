@@ -1025,9 +1025,9 @@ function updatePeakActivityChart() {
     charts.peakActivity.update();
 }
 
-// Auto-refresh data when live
+// Auto-refresh data when live (skipped while the tab is in the background)
 setInterval(() => {
-    if (liveStatus) {
+    if (liveStatus && !document.hidden) {
         loadCurrentData();
         loadDetailedData();
         loadWeather();
@@ -1052,5 +1052,9 @@ function initializeDashboard() {
     updateLiveStatusDisplay();
     updateStatsVisibility();
     checkSerialStatus();
-    setInterval(checkSerialStatus, 2000);
+    setInterval(() => {
+        if (!document.hidden) {
+            checkSerialStatus();
+        }
+    }, 2000);
 }